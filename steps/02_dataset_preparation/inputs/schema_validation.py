@@ -4,11 +4,78 @@ Dataset schema validation for OpenRCA telemetry data
 """
 import os
 import json
-import pandas as pd
-import pytz
-from datetime import datetime
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+import polars as pl
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+
+def _scan_children(path) -> Dict[str, os.DirEntry]:
+    """List a directory once, keyed by entry name"""
+    with os.scandir(path) as it:
+        return {entry.name: entry for entry in it}
+
+
+def _count_lines(path) -> int:
+    """Count lines with raw 1 MiB reads, without any CSV parsing"""
+    count = 0
+    last = b"\n"
+    with open(path, 'rb', buffering=0) as f:
+        for buf in iter(lambda: f.read(1 << 20), b""):
+            count += buf.count(b"\n")
+            last = buf[-1:]
+    # A final line without a trailing newline still counts
+    return count + (last != b"\n")
+
+
+def _scan_tree(root) -> Dict[str, Dict[str, os.DirEntry]]:
+    """Walk a directory tree once, mapping every directory path to its children
+    
+    Unreadable directories are recorded with no children, like rglob skipping them.
+    """
+    tree = {}
+    pending = [os.fspath(root)]
+    while pending:
+        path = pending.pop()
+        try:
+            tree[path] = _scan_children(path)
+        except OSError:
+            tree[path] = {}
+            continue
+        pending.extend(entry.path for entry in tree[path].values()
+                       if entry.is_dir(follow_symlinks=False))
+    return tree
+
+
+@dataclass(slots=True)
+class DatasetResult:
+    """Validation outcome for a single dataset"""
+    status: str = "pending"
+    path: str = ""
+    files_found: List[str] = field(default_factory=list)
+    files_missing: List[str] = field(default_factory=list)
+    telemetry_validation: Dict[str, Any] = field(default_factory=dict)
+    schema_validation: Dict[str, Any] = field(default_factory=dict)
+    statistics: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Report form; "error" is only present for datasets that failed outright"""
+        result = {f.name: getattr(self, f.name) for f in fields(self)}
+        if self.error is None:
+            del result["error"]
+        return result
+
 
 class DatasetValidator:
     def __init__(self, base_path: str, expected_structure: Dict):
@@ -21,19 +88,61 @@ class DatasetValidator:
             "warnings": [],
             "statistics": {}
         }
+        
+        # CSV schema results from previous runs, keyed by path, mtime and size
+        self.cache_path = self.base_path / ".validation_cache.json"
+        self._cache = self._load_cache()
+        self._fresh_cache = {}
+    
+    def _load_cache(self) -> Dict[str, Dict[str, Any]]:
+        """Load cached CSV schema results, ignoring a missing or unreadable cache"""
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_cache(self):
+        """Atomically persist the CSV schema results seen in this run"""
+        if self._fresh_cache == self._cache:
+            return
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._fresh_cache, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            self.validation_results["warnings"].append(f"Could not write validation cache: {e}")
     
     def validate_all_datasets(self) -> Dict[str, Any]:
         """Validate all datasets in the structure"""
         print(f"Starting validation of datasets in {self.base_path}")
         
+        datasets = []
         for dataset_name, structure in self.expected_structure.items():
             if dataset_name == "Market":
                 # Handle Market subdatasets
                 for subname, substructure in structure.items():
-                    full_name = f"Market/{subname}"
-                    self.validate_dataset(full_name, substructure)
+                    datasets.append((f"Market/{subname}", substructure))
             else:
-                self.validate_dataset(dataset_name, structure)
+                datasets.append((dataset_name, structure))
+        
+        existing = self._find_existing_datasets([dataset_name for dataset_name, _ in datasets])
+        
+        # Datasets are I/O bound and independent, so validate them concurrently
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = [
+                (dataset_name, executor.submit(self.validate_dataset, dataset_name, structure, existing))
+                for dataset_name, structure in datasets
+            ]
+            for dataset_name, future in futures:
+                dataset_result = future.result()
+                if dataset_result.error is not None:
+                    self.validation_results["errors"].append(dataset_result.error)
+                self.validation_results["datasets"][dataset_name] = dataset_result.to_dict()
+        
+        self._save_cache()
         
         # Calculate overall status
         dataset_statuses = [info["status"] for info in self.validation_results["datasets"].values()]
@@ -46,92 +155,163 @@ class DatasetValidator:
             
         return self.validation_results
     
-    def validate_dataset(self, dataset_name: str, structure: Dict):
+    def _find_existing_datasets(self, dataset_names: List[str]) -> set:
+        """Return the datasets whose directories exist, listing each parent directory once"""
+        listings = {}
+        existing = set()
+        for dataset_name in dataset_names:
+            parent, _, name = dataset_name.rpartition("/")
+            if parent not in listings:
+                try:
+                    listings[parent] = _scan_children(self.base_path / parent)
+                except OSError:
+                    listings[parent] = {}
+            entry = listings[parent].get(name)
+            if entry is not None and entry.is_dir():
+                existing.add(dataset_name)
+        return existing
+    
+    def validate_dataset(self, dataset_name: str, structure: Dict, existing: set = None) -> DatasetResult:
         """Validate a single dataset"""
         dataset_path = self.base_path / dataset_name
-        dataset_result = {
-            "status": "pending",
-            "path": str(dataset_path),
-            "files_found": [],
-            "files_missing": [],
-            "telemetry_validation": {},
-            "schema_validation": {},
-            "statistics": {}
-        }
+        dataset_result = DatasetResult(path=str(dataset_path))
         
         print(f"Validating dataset: {dataset_name}")
         
         # Check if dataset directory exists
-        if not dataset_path.exists():
-            dataset_result["status"] = "missing"
-            dataset_result["error"] = f"Dataset directory not found: {dataset_path}"
-            self.validation_results["errors"].append(dataset_result["error"])
-            self.validation_results["datasets"][dataset_name] = dataset_result
-            return
+        if existing is not None:
+            dataset_exists = dataset_name in existing
+        else:
+            dataset_exists = dataset_path.exists()
+        if not dataset_exists:
+            dataset_result.status = "missing"
+            dataset_result.error = f"Dataset directory not found: {dataset_path}"
+            return dataset_result
+        
+        # Walk the dataset once; every check below reads from this listing
+        tree = _scan_tree(dataset_path)
+        root_entries = tree[os.fspath(dataset_path)]
         
         # Validate required files
         for required_file in structure["files"]:
-            file_path = dataset_path / required_file
-            if file_path.exists():
-                dataset_result["files_found"].append(required_file)
+            file_entry = root_entries.get(required_file)
+            if file_entry is not None:
+                dataset_result.files_found.append(required_file)
                 # Validate CSV schema
                 try:
-                    schema_result = self.validate_csv_schema(file_path, required_file)
-                    dataset_result["schema_validation"][required_file] = schema_result
+                    schema_result = self.validate_csv_schema(Path(file_entry.path), required_file)
+                    dataset_result.schema_validation[required_file] = schema_result
                 except Exception as e:
-                    dataset_result["schema_validation"][required_file] = {
+                    dataset_result.schema_validation[required_file] = {
                         "status": "error",
                         "error": str(e)
                     }
             else:
-                dataset_result["files_missing"].append(required_file)
+                dataset_result.files_missing.append(required_file)
         
         # Validate telemetry structure
-        telemetry_path = dataset_path / "telemetry"
-        if telemetry_path.exists():
-            dataset_result["telemetry_validation"] = self.validate_telemetry_structure(
-                telemetry_path, structure["telemetry_dates"], structure["telemetry_types"]
+        telemetry_entry = root_entries.get("telemetry")
+        if telemetry_entry is not None and telemetry_entry.is_dir():
+            dataset_result.telemetry_validation = self.validate_telemetry_structure(
+                telemetry_entry.path, structure["telemetry_dates"], structure["telemetry_types"], tree
             )
         else:
-            dataset_result["telemetry_validation"] = {
+            dataset_result.telemetry_validation = {
                 "status": "missing",
                 "error": "Telemetry directory not found"
             }
         
         # Calculate dataset statistics
-        dataset_result["statistics"] = self.calculate_dataset_statistics(dataset_path)
+        dataset_result.statistics = self.calculate_dataset_statistics(tree)
         
         # Determine overall dataset status
-        if (not dataset_result["files_missing"] and 
-            dataset_result["telemetry_validation"].get("status") == "valid"):
-            dataset_result["status"] = "valid"
-        elif dataset_result["files_found"]:
-            dataset_result["status"] = "partial"
+        if (not dataset_result.files_missing and 
+            dataset_result.telemetry_validation.get("status") == "valid"):
+            dataset_result.status = "valid"
+        elif dataset_result.files_found:
+            dataset_result.status = "partial"
         else:
-            dataset_result["status"] = "invalid"
+            dataset_result.status = "invalid"
         
-        self.validation_results["datasets"][dataset_name] = dataset_result
+        return dataset_result
+    
+    def validate_csv_schema(self, file_path: Path, file_type: str, fast_count: bool = True) -> Dict[str, Any]:
+        """Validate CSV file schema, reusing the cached result for unchanged files"""
+        stat = file_path.stat()
+        # The scan mode is part of the key so a fast count never answers an exact request
+        cache_key = f"{file_path}:{file_type}:{int(fast_count)}:{stat.st_mtime_ns}:{stat.st_size}"
+        result = self._cache.get(cache_key)
+        if result is None:
+            result = self._scan_csv_schema(file_path, file_type, stat.st_size, fast_count)
+        # Only successful scans are worth skipping next time
+        if result["status"] == "valid":
+            self._fresh_cache[cache_key] = result
+        return result
     
-    def validate_csv_schema(self, file_path: Path, file_type: str) -> Dict[str, Any]:
-        """Validate CSV file schema"""
+    def _scan_csv_schema(self, file_path: Path, file_type: str, file_size: int,
+                         fast_count: bool) -> Dict[str, Any]:
+        """Read a CSV file and collect its schema statistics
+        
+        When no column-level checks apply and fast_count is set, rows are counted
+        from raw newlines, which overcounts fields with embedded line breaks.
+        """
         try:
-            df = pd.read_csv(file_path)
+            # Quoted fields (e.g. query.csv instructions) may span lines
+            parse_options = pacsv.ParseOptions(newlines_in_values=True)
+            
+            # Only the header block is decoded to learn the column names
+            columns = pacsv.open_csv(file_path, parse_options=parse_options).schema.names
+            
+            # Project just the columns the type-specific checks need
+            if file_type == "record.csv":
+                projected = [col for col in ("component", "reason") if col in columns]
+            elif file_type == "query.csv":
+                projected = [col for col in ("task_index",) if col in columns]
+            else:
+                projected = []
+            
+            row_count = 0
+            unique_values = {col: set() for col in projected}
+            if not projected and fast_count:
+                # Only the row count is needed; skip the header line
+                row_count = max(_count_lines(file_path) - 1, 0)
+            else:
+                # Low-cardinality columns are dictionary-encoded, so distinct values are
+                # read off each batch's dictionary instead of hashing every cell.
+                # An empty include list means "all columns" to PyArrow.
+                reader = pacsv.open_csv(
+                    file_path,
+                    parse_options=parse_options,
+                    convert_options=pacsv.ConvertOptions(
+                        include_columns=projected or columns[:1],
+                        column_types={col: pa.dictionary(pa.int32(), pa.string()) for col in projected},
+                        strings_can_be_null=True
+                    )
+                )
+                while True:
+                    try:
+                        batch = reader.read_next_batch()
+                    except StopIteration:
+                        break
+                    row_count += batch.num_rows
+                    for col, values in unique_values.items():
+                        values.update(batch.column(col).dictionary.to_pylist())
             
             result = {
                 "status": "valid",
-                "rows": len(df),
-                "columns": list(df.columns),
-                "memory_usage_mb": df.memory_usage(deep=True).sum() / 1024 / 1024
+                "rows": row_count,
+                "columns": columns,
+                "file_size_mb": file_size / 1024 / 1024
             }
             
             # Specific validations based on file type
             if file_type == "record.csv":
-                result["timestamp_validation"] = self.validate_timestamps(df, "timestamp")
-                result["unique_components"] = df["component"].nunique() if "component" in df.columns else 0
-                result["unique_reasons"] = df["reason"].nunique() if "reason" in df.columns else 0
+                result["timestamp_validation"] = self.validate_timestamps(file_path, "timestamp")
+                result["unique_components"] = len(unique_values.get("component", ()))
+                result["unique_reasons"] = len(unique_values.get("reason", ()))
                 
             elif file_type == "query.csv":
-                result["unique_tasks"] = df["task_index"].nunique() if "task_index" in df.columns else 0
+                result["unique_tasks"] = len(unique_values.get("task_index", ()))
                 
             return result
             
@@ -141,9 +321,16 @@ class DatasetValidator:
                 "error": str(e)
             }
     
-    def validate_telemetry_structure(self, telemetry_path: Path, expected_dates: List[str], 
-                                   expected_types: List[str]) -> Dict[str, Any]:
+    def validate_telemetry_structure(self, telemetry_path: Union[str, Path], expected_dates: List[str], 
+                                   expected_types: List[str],
+                                   tree: Dict[str, Dict[str, os.DirEntry]] = None) -> Dict[str, Any]:
         """Validate telemetry directory structure"""
+        # Paths below are plain strings taken from DirEntry.path, matching the tree keys
+        tree = tree or {}
+        
+        def children(path: str) -> Dict[str, os.DirEntry]:
+            return tree[path] if path in tree else _scan_children(path)
+        
         result = {
             "status": "pending",
             "dates_found": [],
@@ -151,28 +338,28 @@ class DatasetValidator:
             "type_validation": {}
         }
         
-        # Check date directories
+        # Check date directories against a single listing of the telemetry root
+        date_entries = children(os.fspath(telemetry_path))
         for date in expected_dates:
-            date_path = telemetry_path / date
-            if date_path.exists():
+            date_entry = date_entries.get(date)
+            if date_entry is not None and date_entry.is_dir():
                 result["dates_found"].append(date)
                 # Check telemetry types in this date
+                type_entries = children(date_entry.path)
+                date_validation = result["type_validation"][date] = {}
                 for tel_type in expected_types:
-                    type_path = date_path / tel_type
-                    if type_path.exists():
+                    type_entry = type_entries.get(tel_type)
+                    if type_entry is not None and type_entry.is_dir():
                         # Count CSV files in this type directory
-                        csv_files = list(type_path.glob("*.csv"))
-                        if date not in result["type_validation"]:
-                            result["type_validation"][date] = {}
-                        result["type_validation"][date][tel_type] = {
+                        csv_files = [name for name, entry in children(type_entry.path).items()
+                                     if name.endswith(".csv") and entry.is_file()]
+                        date_validation[tel_type] = {
                             "status": "found",
                             "file_count": len(csv_files),
-                            "files": [f.name for f in csv_files]
+                            "files": csv_files
                         }
                     else:
-                        if date not in result["type_validation"]:
-                            result["type_validation"][date] = {}
-                        result["type_validation"][date][tel_type] = {
+                        date_validation[tel_type] = {
                             "status": "missing"
                         }
             else:
@@ -188,27 +375,29 @@ class DatasetValidator:
             
         return result
     
-    def validate_timestamps(self, df: pd.DataFrame, timestamp_col: str) -> Dict[str, Any]:
+    def validate_timestamps(self, file_path: Path, timestamp_col: str) -> Dict[str, Any]:
         """Validate timestamp format and ranges"""
-        if timestamp_col not in df.columns:
-            return {"status": "missing_column"}
-        
         try:
-            timestamps = pd.to_numeric(df[timestamp_col])
+            scan = pl.scan_csv(file_path)
+            if timestamp_col not in scan.collect_schema().names():
+                return {"status": "missing_column"}
             
-            # Detect if timestamps are in seconds or milliseconds
-            min_ts = timestamps.min()
-            max_ts = timestamps.max()
+            # Aggregate in a single streaming pass, reading only the timestamp column
+            min_ts, max_ts, total_records = scan.select([
+                pl.col(timestamp_col).cast(pl.Float64).min().alias("min"),
+                pl.col(timestamp_col).cast(pl.Float64).max().alias("max"),
+                pl.len()
+            ]).collect(engine="streaming").row(0)
             
             # Assume if timestamp > 1e12, it's in milliseconds
             if min_ts > 1e12:
                 unit = "milliseconds"
-                min_dt = pd.to_datetime(min_ts, unit='ms', utc=True)
-                max_dt = pd.to_datetime(max_ts, unit='ms', utc=True)
+                min_dt = datetime.fromtimestamp(min_ts / 1000, tz=timezone.utc)
+                max_dt = datetime.fromtimestamp(max_ts / 1000, tz=timezone.utc)
             else:
                 unit = "seconds"
-                min_dt = pd.to_datetime(min_ts, unit='s', utc=True)
-                max_dt = pd.to_datetime(max_ts, unit='s', utc=True)
+                min_dt = datetime.fromtimestamp(min_ts, tz=timezone.utc)
+                max_dt = datetime.fromtimestamp(max_ts, tz=timezone.utc)
             
             return {
                 "status": "valid",
@@ -216,7 +405,7 @@ class DatasetValidator:
                 "min_timestamp": str(min_dt),
                 "max_timestamp": str(max_dt),
                 "range_days": (max_dt - min_dt).days,
-                "total_records": len(timestamps)
+                "total_records": total_records
             }
             
         except Exception as e:
@@ -225,8 +414,8 @@ class DatasetValidator:
                 "error": str(e)
             }
     
-    def calculate_dataset_statistics(self, dataset_path: Path) -> Dict[str, Any]:
-        """Calculate overall dataset statistics"""
+    def calculate_dataset_statistics(self, tree: Dict[str, Dict[str, os.DirEntry]]) -> Dict[str, Any]:
+        """Calculate overall dataset statistics from an already scanned tree"""
         stats = {
             "total_size_mb": 0,
             "file_count": 0,
@@ -234,22 +423,32 @@ class DatasetValidator:
         }
         
         try:
-            for file_path in dataset_path.rglob("*"):
-                if file_path.is_file():
-                    stats["file_count"] += 1
-                    stats["total_size_mb"] += file_path.stat().st_size / 1024 / 1024
-                    if file_path.suffix == ".csv":
-                        stats["csv_file_count"] += 1
+            for entries in tree.values():
+                for name, entry in entries.items():
+                    if entry.is_file():
+                        stats["file_count"] += 1
+                        stats["total_size_mb"] += entry.stat().st_size / 1024 / 1024
+                        if name.endswith(".csv"):
+                            stats["csv_file_count"] += 1
         except Exception as e:
             stats["error"] = str(e)
             
         return stats
 
 
+def _print_json(data: Dict[str, Any]):
+    """Print indented JSON on stdout, using orjson when it is available"""
+    if orjson is None:
+        print(json.dumps(data, indent=2, sort_keys=True))
+        return
+    # Flush pending print() output so the report stays after it
+    sys.stdout.flush()
+    sys.stdout.buffer.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+    sys.stdout.write("\n")
+
+
 def main():
     """Main validation function"""
-    import sys
-    
     if len(sys.argv) != 3:
         print("Usage: python schema_validation.py <dataset_path> <sources_json>")
         sys.exit(1)
@@ -268,7 +467,7 @@ def main():
     results = validator.validate_all_datasets()
     
     # Output results
-    print(json.dumps(results, indent=2))
+    _print_json(results)
     
     # Exit with appropriate code
     if results["validation_status"] == "success":
@@ -119,4 +119,35 @@ except Exception as e:
     sys.exit(1)
 "
 
+# Test CSV scanning of quoted multi-line fields spanning several read blocks
+echo "Testing multi-line CSV validation..."
+python -c "
+import csv
+import os
+import sys
+import tempfile
+from pathlib import Path
+sys.path.append('inputs')
+import schema_validation
+
+with tempfile.TemporaryDirectory() as tmp:
+    query_path = Path(tmp) / 'query.csv'
+    with open(query_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['task_index', 'instruction', 'scoring_points'])
+        for i in range(6000):
+            writer.writerow([f'task_{i % 7 + 1}', 'line one\\nline two ' + 'x' * 300, 'point one\\npoint two'])
+    
+    # Larger than one 1 MiB block, so values must not be split on raw newlines
+    assert os.path.getsize(query_path) > 1024 * 1024
+    
+    validator = schema_validation.DatasetValidator(tmp, {})
+    result = validator.validate_csv_schema(query_path, 'query.csv')
+    if result['status'] != 'valid' or result['rows'] != 6000:
+        print(f'Multi-line CSV validation failed: {result}')
+        sys.exit(1)
+
+print('Multi-line CSV validation: PASSED')
+"
+
 echo "Dataset preparation tests: PASSED"
\ No newline at end of file
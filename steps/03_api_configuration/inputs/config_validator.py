@@ -3,6 +3,7 @@
 API Configuration Validator for OpenRCA Pipeline
 Validates API configurations without making actual API calls
 """
+import functools
 import os
 import re
 import yaml
@@ -11,6 +12,79 @@ import sys
 from typing import Dict, List, Any, Optional
 from pathlib import Path
 
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader, SafeDumper
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+# Compiled once at import so key validation is a single match() call
+_API_KEY_PATTERNS = {
+    "OpenAI": re.compile(r"^sk-[A-Za-z0-9]{48,}$"),
+    "Anthropic": re.compile(r"^sk-ant-[A-Za-z0-9-_]{95,}$")
+}
+
+# ${VAR} references, anywhere inside a string value
+_ENV_RE = re.compile(r"\$\{([^}]+)\}")
+
+
+def _expand_env(value: str) -> str:
+    """Replace ${VAR} references with their environment values, leaving unset ones intact"""
+    return _ENV_RE.sub(lambda m: os.environ.get(m.group(1), m.group(0)), value)
+
+
+_DEFAULT_CAPABILITIES = {
+    "context_length": 8192,
+    "supports_function_calling": False,
+    "supports_vision": False,
+    "estimated_cost_per_1k_input_tokens": 0.001,
+    "estimated_cost_per_1k_output_tokens": 0.002
+}
+
+# Model-specific overrides; first matching name fragment wins, so more specific entries come first
+_CAPS_TABLE = (
+    ("gpt-4o", {
+        "context_length": 128000,
+        "supports_function_calling": True,
+        "supports_vision": True,
+        "estimated_cost_per_1k_input_tokens": 0.0025,
+        "estimated_cost_per_1k_output_tokens": 0.01
+    }),
+    ("gpt-4", {
+        "context_length": 32768,
+        "supports_function_calling": True,
+        "estimated_cost_per_1k_input_tokens": 0.01,
+        "estimated_cost_per_1k_output_tokens": 0.03
+    }),
+    ("claude-3-sonnet", {
+        "context_length": 200000,
+        "supports_function_calling": True,
+        "estimated_cost_per_1k_input_tokens": 0.003,
+        "estimated_cost_per_1k_output_tokens": 0.015
+    }),
+    ("claude-3-haiku", {
+        "context_length": 200000,
+        "estimated_cost_per_1k_input_tokens": 0.00025,
+        "estimated_cost_per_1k_output_tokens": 0.00125
+    }),
+)
+
+
+@functools.lru_cache(maxsize=32)
+def _caps_for(model: str) -> Dict[str, Any]:
+    """Resolve capabilities for a model name (cached; callers must copy before mutating)"""
+    capabilities = dict(_DEFAULT_CAPABILITIES)
+    for fragment, overrides in _CAPS_TABLE:
+        if fragment in model:
+            capabilities.update(overrides)
+            break
+    return capabilities
+
+
 class APIConfigValidator:
     def __init__(self):
         self.supported_providers = {
@@ -21,7 +95,7 @@ class APIConfigValidator:
                     "gpt-4",
                     "gpt-3.5-turbo"
                 ],
-                "api_key_pattern": r"^sk-[A-Za-z0-9]{48,}$",
+                "api_key_pattern": _API_KEY_PATTERNS["OpenAI"],
                 "required_fields": ["SOURCE", "MODEL", "API_KEY"]
             },
             "Anthropic": {
@@ -32,11 +106,18 @@ class APIConfigValidator:
                     "claude-2.1",
                     "claude-2"
                 ],
-                "api_key_pattern": r"^sk-ant-[A-Za-z0-9-_]{95,}$",
+                "api_key_pattern": _API_KEY_PATTERNS["Anthropic"],
                 "required_fields": ["SOURCE", "MODEL", "API_KEY"]
             }
         }
         
+        # Lookup tables derived once from supported_providers
+        self._models_by_provider = {
+            provider: frozenset(provider_config["models"])
+            for provider, provider_config in self.supported_providers.items()
+        }
+        self._provider_names = tuple(self.supported_providers)
+        
         self.validation_results = {
             "validation_status": "pending",
             "provider": None,
@@ -51,31 +132,10 @@ class APIConfigValidator:
         """Validate the complete API configuration"""
         try:
             with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-            
-            # Basic structure validation
-            self._validate_structure(config)
-            
-            # Provider-specific validation
-            self._validate_provider(config)
-            
-            # Model validation
-            self._validate_model(config)
+                config = yaml.load(f, Loader=SafeLoader)
             
-            # API key validation (format only, no calls)
-            self._validate_api_key(config)
-            
-            # Parameter validation
-            self._validate_parameters(config)
-            
-            # Security validation
-            self._validate_security(config)
-            
-            # Rate limiting validation
-            self._validate_rate_limits(config)
-            
-            # Set capabilities
-            self._detect_capabilities(config)
+            # Every check runs in one pass over the configuration
+            self._validate_all(config)
             
             # Determine final status
             if not self.validation_results["errors"]:
@@ -89,8 +149,70 @@ class APIConfigValidator:
         
         return self.validation_results
     
+    def _validate_all(self, config: Dict[str, Any]):
+        """Run every check, reading each configuration field once"""
+        provider = config.get("SOURCE")
+        model = config.get("MODEL")
+        
+        # Basic structure validation
+        self._check_structure(config)
+        
+        # Provider-specific validation
+        self._check_provider(provider, config)
+        
+        # Model validation
+        self._check_model(model, provider)
+        
+        # API key validation (format only, no calls)
+        self._check_api_key(config.get("API_KEY", ""), provider)
+        
+        # Parameter validation
+        self._check_parameters(config.get("MODEL_PARAMETERS", {}))
+        
+        # Security validation
+        self._check_security(config.get("LOGGING", {}), config.get("API_BASE", ""))
+        
+        # Rate limiting validation
+        self._check_rate_limits(config.get("RATE_LIMITS", {}))
+        
+        # Set capabilities
+        self.validation_results["capabilities"] = dict(_caps_for(model or ""))
+    
+    # The _validate_* methods below are kept for callers that run a single check
+    
     def _validate_structure(self, config: Dict[str, Any]):
         """Validate basic configuration structure"""
+        self._check_structure(config)
+    
+    def _validate_provider(self, config: Dict[str, Any]):
+        """Validate provider configuration"""
+        self._check_provider(config.get("SOURCE"), config)
+    
+    def _validate_model(self, config: Dict[str, Any]):
+        """Validate model configuration"""
+        self._check_model(config.get("MODEL"), config.get("SOURCE"))
+    
+    def _validate_api_key(self, config: Dict[str, Any]):
+        """Validate API key format (without making API calls)"""
+        self._check_api_key(config.get("API_KEY", ""), config.get("SOURCE"))
+    
+    def _validate_parameters(self, config: Dict[str, Any]):
+        """Validate model parameters"""
+        self._check_parameters(config.get("MODEL_PARAMETERS", {}))
+    
+    def _validate_security(self, config: Dict[str, Any]):
+        """Validate security settings"""
+        self._check_security(config.get("LOGGING", {}), config.get("API_BASE", ""))
+    
+    def _validate_rate_limits(self, config: Dict[str, Any]):
+        """Validate rate limiting configuration"""
+        self._check_rate_limits(config.get("RATE_LIMITS", {}))
+    
+    def _detect_capabilities(self, config: Dict[str, Any]):
+        """Detect model capabilities based on model name"""
+        self.validation_results["capabilities"] = dict(_caps_for(config.get("MODEL", "")))
+    
+    def _check_structure(self, config: Dict[str, Any]):
         required_top_level = ["SOURCE", "MODEL", "API_KEY"]
         
         for field in required_top_level:
@@ -106,17 +228,14 @@ class APIConfigValidator:
                         f"Environment variable {env_var} not set for {key}"
                     )
     
-    def _validate_provider(self, config: Dict[str, Any]):
-        """Validate provider configuration"""
-        provider = config.get("SOURCE")
-        
+    def _check_provider(self, provider: Optional[str], config: Dict[str, Any]):
         if not provider:
             self.validation_results["errors"].append("SOURCE (provider) not specified")
             return
         
-        if provider not in self.supported_providers:
+        if provider not in self._models_by_provider:
             self.validation_results["errors"].append(
-                f"Unsupported provider: {provider}. Supported: {list(self.supported_providers.keys())}"
+                f"Unsupported provider: {provider}. Supported: {list(self._provider_names)}"
             )
             return
         
@@ -130,29 +249,21 @@ class APIConfigValidator:
                     f"Missing required field for {provider}: {field}"
                 )
     
-    def _validate_model(self, config: Dict[str, Any]):
-        """Validate model configuration"""
-        model = config.get("MODEL")
-        provider = config.get("SOURCE")
-        
+    def _check_model(self, model: Optional[str], provider: Optional[str]):
         if not model:
             self.validation_results["errors"].append("MODEL not specified")
             return
         
-        if provider and provider in self.supported_providers:
-            supported_models = self.supported_providers[provider]["models"]
-            if model not in supported_models:
+        if provider and provider in self._models_by_provider:
+            if model not in self._models_by_provider[provider]:
                 self.validation_results["warnings"].append(
-                    f"Model {model} not in supported list for {provider}: {supported_models}"
+                    f"Model {model} not in supported list for {provider}: "
+                    f"{self.supported_providers[provider]['models']}"
                 )
         
         self.validation_results["model"] = model
     
-    def _validate_api_key(self, config: Dict[str, Any]):
-        """Validate API key format (without making API calls)"""
-        api_key = config.get("API_KEY", "")
-        provider = config.get("SOURCE")
-        
+    def _check_api_key(self, api_key: str, provider: Optional[str]):
         # Handle environment variable substitution
         if api_key.startswith("${") and api_key.endswith("}"):
             env_var = api_key[2:-1]
@@ -169,7 +280,7 @@ class APIConfigValidator:
         # Validate format based on provider
         if provider in self.supported_providers:
             pattern = self.supported_providers[provider]["api_key_pattern"]
-            if not re.match(pattern, api_key):
+            if not pattern.match(api_key):
                 self.validation_results["warnings"].append(
                     f"API key format may be invalid for {provider}"
                 )
@@ -180,10 +291,7 @@ class APIConfigValidator:
         else:
             self.validation_results["errors"].append("API key appears to be too short")
     
-    def _validate_parameters(self, config: Dict[str, Any]):
-        """Validate model parameters"""
-        params = config.get("MODEL_PARAMETERS", {})
-        
+    def _check_parameters(self, params: Dict[str, Any]):
         # Temperature validation
         temp = params.get("temperature", 0.7)
         if not isinstance(temp, (int, float)) or temp < 0 or temp > 2:
@@ -205,10 +313,7 @@ class APIConfigValidator:
                 "timeout should be a positive integer (seconds)"
             )
     
-    def _validate_security(self, config: Dict[str, Any]):
-        """Validate security settings"""
-        logging_config = config.get("LOGGING", {})
-        
+    def _check_security(self, logging_config: Dict[str, Any], api_base: str):
         # Check if response logging is disabled (for privacy)
         if logging_config.get("log_responses", False):
             self.validation_results["warnings"].append(
@@ -216,16 +321,12 @@ class APIConfigValidator:
             )
         
         # Check API base URL
-        api_base = config.get("API_BASE", "")
         if api_base and not api_base.startswith("https://"):
             self.validation_results["warnings"].append(
                 "API base URL should use HTTPS for security"
             )
     
-    def _validate_rate_limits(self, config: Dict[str, Any]):
-        """Validate rate limiting configuration"""
-        rate_limits = config.get("RATE_LIMITS", {})
-        
+    def _check_rate_limits(self, rate_limits: Dict[str, Any]):
         rpm = rate_limits.get("requests_per_minute", 60)
         if not isinstance(rpm, int) or rpm < 1:
             self.validation_results["warnings"].append(
@@ -238,63 +339,18 @@ class APIConfigValidator:
                 "tokens_per_minute should be a positive integer"
             )
     
-    def _detect_capabilities(self, config: Dict[str, Any]):
-        """Detect model capabilities based on model name"""
-        model = config.get("MODEL", "")
-        provider = config.get("SOURCE", "")
-        
-        capabilities = {
-            "context_length": 8192,  # Default
-            "supports_function_calling": False,
-            "supports_vision": False,
-            "estimated_cost_per_1k_input_tokens": 0.001,
-            "estimated_cost_per_1k_output_tokens": 0.002
-        }
-        
-        # Model-specific capabilities
-        if "gpt-4o" in model:
-            capabilities.update({
-                "context_length": 128000,
-                "supports_function_calling": True,
-                "supports_vision": True,
-                "estimated_cost_per_1k_input_tokens": 0.0025,
-                "estimated_cost_per_1k_output_tokens": 0.01
-            })
-        elif "gpt-4" in model:
-            capabilities.update({
-                "context_length": 32768,
-                "supports_function_calling": True,
-                "estimated_cost_per_1k_input_tokens": 0.01,
-                "estimated_cost_per_1k_output_tokens": 0.03
-            })
-        elif "claude-3-sonnet" in model:
-            capabilities.update({
-                "context_length": 200000,
-                "supports_function_calling": True,
-                "estimated_cost_per_1k_input_tokens": 0.003,
-                "estimated_cost_per_1k_output_tokens": 0.015
-            })
-        elif "claude-3-haiku" in model:
-            capabilities.update({
-                "context_length": 200000,
-                "estimated_cost_per_1k_input_tokens": 0.00025,
-                "estimated_cost_per_1k_output_tokens": 0.00125
-            })
-        
-        self.validation_results["capabilities"] = capabilities
-    
     def create_validated_config(self, template_path: str, output_path: str) -> bool:
         """Create a validated configuration file"""
         try:
             with open(template_path, 'r') as f:
-                config = yaml.safe_load(f)
+                config = yaml.load(f, Loader=SafeLoader)
             
             # Substitute environment variables
-            self._substitute_env_vars(config)
+            config = self._substitute_env_vars(config)
             
             # Save validated configuration
             with open(output_path, 'w') as f:
-                yaml.dump(config, f, default_flow_style=False, indent=2)
+                yaml.dump(config, f, Dumper=SafeDumper, default_flow_style=False, indent=2)
             
             return True
             
@@ -302,20 +358,26 @@ class APIConfigValidator:
             self.validation_results["errors"].append(f"Error creating config: {str(e)}")
             return False
     
-    def _substitute_env_vars(self, config: Dict[str, Any]):
-        """Substitute environment variables in configuration"""
-        def substitute_recursive(obj):
-            if isinstance(obj, dict):
-                for key, value in obj.items():
-                    obj[key] = substitute_recursive(value)
-            elif isinstance(obj, list):
-                return [substitute_recursive(item) for item in obj]
-            elif isinstance(obj, str) and obj.startswith("${") and obj.endswith("}"):
-                env_var = obj[2:-1]
-                return os.environ.get(env_var, obj)
-            return obj
-        
-        substitute_recursive(config)
+    def _substitute_env_vars(self, config: Any) -> Any:
+        """Return a copy of the configuration with environment variables substituted"""
+        if isinstance(config, dict):
+            return {key: self._substitute_env_vars(value) for key, value in config.items()}
+        if isinstance(config, list):
+            return [self._substitute_env_vars(item) for item in config]
+        if isinstance(config, str):
+            return _expand_env(config)
+        return config
+
+
+def _print_json(data: Dict[str, Any]):
+    """Print indented JSON on stdout, using orjson when it is available"""
+    if orjson is None:
+        print(json.dumps(data, indent=2, sort_keys=True))
+        return
+    # Flush pending print() output so the report stays after it
+    sys.stdout.flush()
+    sys.stdout.buffer.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+    sys.stdout.write("\n")
 
 
 def main():
@@ -337,7 +399,7 @@ def main():
     results["config_created"] = success
     
     # Output results
-    print(json.dumps(results, indent=2))
+    _print_json(results)
     
     # Exit with appropriate code
     if results["validation_status"] == "success" and success:
@@ -71,4 +71,12 @@ user = """Please generate a issue related to DevOps failure diagnosis based on t
 
 ```query
 {output_specification}
-```"""
\ No newline at end of file
+```"""
+
+template_note = """
+
+Some values in the specifications are placeholders wrapped in double braces (e.g., {{TIME_PERIOD}}, {{NUM}}). Copy every placeholder into the issue verbatim wherever the corresponding value belongs; the real values will be filled in later."""
+
+json_reminder = """
+
+Reminder: reply with the JSON object {"issue": ...} only. Do not wrap it in "```json" and "```" tags or add any text outside the brackets "{}"."""
@@ -3,6 +3,11 @@
 Query Generator for OpenRCA Pipeline
 Based on main/generate.py but modularized for pipeline execution
 """
+import asyncio
+import csv
+import functools
+import hashlib
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import random
@@ -10,21 +15,102 @@ import json
 import sys
 import os
 import pytz
+import httpx
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Tuple, Any
 
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
 # Import prompt templates
-from prompt_templates import system, user
+from prompt_templates import system, user, template_note, json_reminder
+
+# Slot markers used when instructions are generated as reusable templates
+TIME_PERIOD_SLOT = "{{TIME_PERIOD}}"
+NUM_SLOT = "{{NUM}}"
+
+# Shape of every generated instruction, enforced by provider-native structured output
+ISSUE_SCHEMA = {
+    "type": "object",
+    "properties": {"issue": {"type": "string"}},
+    "required": ["issue"],
+    "additionalProperties": False,
+}
+
+# OpenAI models accepting response_format json_schema
+JSON_SCHEMA_MODEL_PREFIXES = ("gpt-4o-mini", "gpt-4o-2024-08-06", "gpt-4o-2024-11-20")
+
+# OpenAI models accepting response_format json_object (JSON mode); any model on
+# neither list relies on the prompt alone to return JSON
+JSON_MODE_MODEL_PREFIXES = ("gpt-4o", "gpt-4-turbo", "gpt-4-1106-preview", "gpt-4-0125-preview",
+                            "gpt-3.5-turbo-1106", "gpt-3.5-turbo-0125")
+JSON_MODE_MODELS = ("gpt-3.5-turbo",)
+
+# Columns of the generated <dataset>_query.csv files
+QUERY_COLUMNS = ["task_index", "instruction", "scoring_points"]
+
+# Generated rows written between fsyncs of the query CSV
+FSYNC_EVERY = 50
+
+# Connection pool shared by all requests of a client (HTTP/2 multiplexes over these)
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=64, max_connections=128)
+
+
+def _json_loads(data):
+    """Parse JSON text or bytes, using orjson when it is available"""
+    if orjson is None:
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+def _json_dumps(data: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes, using orjson when it is available"""
+    if orjson is None:
+        return json.dumps(data, indent=2 if indent else None).encode()
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None)
+
+
+@functools.lru_cache(maxsize=None)
+def _timestamp2timeperiod(timestamp: int, tz) -> str:
+    """Format the 30-minute window containing timestamp in tz"""
+    time = datetime.fromtimestamp(timestamp, tz)
+    minute = time.minute
+    start_time = time.replace(minute=minute - (minute % 30), second=0, microsecond=0)
+    end_time = start_time + timedelta(minutes=30)
+    start_time_str = start_time.strftime('%Y-%m-%d %H:%M:%S')
+    end_time_str = end_time.strftime('%Y-%m-%d %H:%M:%S')
+    return f"{start_time_str} to {end_time_str}"
+
+
+@functools.lru_cache(maxsize=None)
+def _timestamp2datetime(timestamp: int, tz) -> str:
+    """Format timestamp in tz"""
+    return datetime.fromtimestamp(timestamp, tz).strftime('%Y-%m-%d %H:%M:%S')
 
 
 class QueryGenerator:
-    def __init__(self, api_config_path: str, task_spec_path: str):
-        self.api_config = self._load_api_config(api_config_path)
-        self.task_templates = self._load_task_specification(task_spec_path)
+    def __init__(self, api_config_path: str, task_spec_path: str, use_template_cache: bool = False,
+                 cache_dir: str = None, api_config: Dict[str, Any] = None,
+                 task_templates: Dict[str, Any] = None):
+        # Already-parsed config/templates (as handed to worker processes) skip the file loads
+        self.api_config = api_config if api_config is not None else self._load_api_config(api_config_path)
+        self.task_templates = (task_templates if task_templates is not None
+                               else self._load_task_specification(task_spec_path))
+        self._renderers = self._build_renderers(self.task_templates)
         self.timezone = pytz.timezone('Asia/Shanghai')  # UTC+8
         random.seed(42)  # Reproducible results
         
+        # Instruction templates keyed by "task_index|extra_spec|single/multi"
+        self.use_template_cache = use_template_cache
+        self._instr_cache: Dict[str, str] = {}
+        
+        # On-disk cache of LLM responses so interrupted runs can resume cheaply
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        
         # Initialize API client based on provider
         self._init_api_client()
         
@@ -53,107 +139,422 @@ class QueryGenerator:
     
     def _load_task_specification(self, spec_path: str) -> Dict[str, Any]:
         """Load task specification templates"""
-        with open(spec_path, 'r') as f:
-            return json.load(f)
+        with open(spec_path, 'rb') as f:
+            return _json_loads(f.read())
+    
+    def _build_renderers(self, task_templates: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Pre-bind the format methods of every task template
+        
+        The query specification only ever contains **UNKNOWN** values, so it is
+        rendered once per task here rather than once per record.
+        """
+        unknown = "**UNKNOWN**"
+        renderers = {}
+        for task_index, template in task_templates.items():
+            output_lines = [
+                f"- {spec.format(time_period=unknown, datetime=unknown, component=unknown, reason=unknown)}"
+                for spec in template['output']
+            ]
+            output_specification = "```query\\n" + "\\n".join(output_lines) + "\\n"
+            renderers[task_index] = {
+                "scoring_points": tuple(point.format for point in template['scoring_points']),
+                "input": tuple(spec.format for spec in template['input']),
+                "output_specification": output_specification.strip() + "\\n```",
+            }
+        return renderers
     
     def _init_api_client(self):
         """Initialize the appropriate API client"""
         provider = self.api_config.get('SOURCE')
+        model_params = self.api_config.get('MODEL_PARAMETERS', {})
+        self.http_timeout = float(model_params.get('timeout', 60))
+        self.retry_attempts = int(model_params.get('retry_attempts', 3))
+        self.retry_delay = float(model_params.get('retry_delay', 1))
+        # Sampling for instruction generation; a reply is a short {"issue": ...} object
+        self.temperature = float(model_params.get('temperature', 0.7))
+        self.top_p = float(model_params.get('top_p', 0.9))
+        # Anthropic takes one of temperature/top_p; top_p only when it alone is configured
+        self._anthropic_top_p = 'top_p' in model_params and 'temperature' not in model_params
+        self.max_tokens = int(model_params.get('query_max_tokens', 512))
+        
+        # The sync client is only needed by direct get_chat_completion calls (the
+        # pipeline itself goes through per-batch async clients), so it is built lazily
+        self.client = None
         
         if provider == 'OpenAI':
             import openai
-            self.client = openai.OpenAI(api_key=self.api_config['API_KEY'])
             self.model = self.api_config['MODEL']
+            # Transient failures worth backing off for; other API errors fail the record
+            self._retriable_errors = (openai.RateLimitError, openai.APIConnectionError,
+                                      openai.InternalServerError)
+            self._api_errors = openai.APIError
         elif provider == 'Anthropic':
             import anthropic
-            self.client = anthropic.Anthropic(api_key=self.api_config['API_KEY'])
             self.model = self.api_config['MODEL']
+            self._retriable_errors = (anthropic.RateLimitError, anthropic.APIConnectionError,
+                                      anthropic.InternalServerError)
+            self._api_errors = anthropic.APIError
         else:
             raise ValueError(f"Unsupported provider: {provider}")
         
         self.provider = provider
+        # Upper bound on in-flight LLM requests when generating a dataset
+        self.concurrency = self.api_config.get('RATE_LIMITS', {}).get('concurrent_requests', 5)
     
-    def get_chat_completion(self, messages: List[Dict[str, str]], temperature: float = 1.0) -> str:
+    def _get_sync_client(self):
+        """Return the sync client, creating it on first use"""
+        if self.client is None:
+            # Persistent keep-alive/HTTP2 connections instead of the SDK default transport
+            http_client = httpx.Client(
+                transport=httpx.HTTPTransport(http2=True, retries=2, limits=HTTP_LIMITS),
+                timeout=self.http_timeout
+            )
+            if self.provider == 'OpenAI':
+                import openai
+                self.client = openai.OpenAI(api_key=self.api_config['API_KEY'], http_client=http_client)
+            else:
+                import anthropic
+                self.client = anthropic.Anthropic(api_key=self.api_config['API_KEY'], http_client=http_client)
+        return self.client
+    
+    def _init_async_client(self):
+        """Create an async client for the configured provider
+        
+        Async clients hold a connection pool bound to the running event loop,
+        so one is created per batch rather than once in __init__.
+        """
+        http_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(http2=True, retries=2, limits=HTTP_LIMITS),
+            timeout=self.http_timeout
+        )
+        # Retries are handled per record in _agenerate_instruction
+        if self.provider == 'OpenAI':
+            import openai
+            return openai.AsyncOpenAI(api_key=self.api_config['API_KEY'], http_client=http_client,
+                                      max_retries=0)
+        else:
+            import anthropic
+            return anthropic.AsyncAnthropic(api_key=self.api_config['API_KEY'], http_client=http_client,
+                                            max_retries=0)
+    
+    def _build_request(self, messages: List[Dict[str, str]], temperature: float,
+                       response_schema: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Build provider-specific create() arguments, with structured output if a schema is given"""
+        if self.provider == 'OpenAI':
+            request = {
+                "model": self.model,
+                "messages": messages,
+                "temperature": temperature,
+                "top_p": self.top_p,
+                "max_tokens": self.max_tokens,
+            }
+            if response_schema is not None:
+                if self.model.startswith(JSON_SCHEMA_MODEL_PREFIXES):
+                    request["response_format"] = {
+                        "type": "json_schema",
+                        "json_schema": {"name": "issue", "schema": response_schema, "strict": True},
+                    }
+                elif self.model.startswith(JSON_MODE_MODEL_PREFIXES) or self.model in JSON_MODE_MODELS:
+                    request["response_format"] = {"type": "json_object"}
+            return request
+        
+        # Convert OpenAI format to Anthropic format
+        system_msg = next((msg['content'] for msg in messages if msg['role'] == 'system'), '')
+        user_messages = [msg for msg in messages if msg['role'] != 'system']
+        request = {
+            "model": self.model,
+            "system": system_msg,
+            "messages": user_messages,
+            "max_tokens": self.max_tokens,
+        }
+        if self._anthropic_top_p:
+            request["top_p"] = self.top_p
+        else:
+            request["temperature"] = temperature
+        if response_schema is not None:
+            request["tools"] = [{
+                "name": "emit_issue",
+                "description": "Emit the generated issue",
+                "input_schema": response_schema,
+            }]
+            request["tool_choice"] = {"type": "tool", "name": "emit_issue"}
+        return request
+    
+    def _parse_response(self, response) -> str:
+        """Extract the reply text; a forced tool call is returned as its JSON arguments"""
+        if self.provider == 'OpenAI':
+            return response.choices[0].message.content
+        for block in response.content:
+            if block.type == 'tool_use':
+                return _json_dumps(block.input).decode()
+        # An empty reply is treated like any other malformed response
+        return response.content[0].text if response.content else ""
+    
+    def get_chat_completion(self, messages: List[Dict[str, str]], temperature: float = 1.0,
+                            response_schema: Dict[str, Any] = None) -> str:
         """Get chat completion from configured provider"""
         try:
+            request = self._build_request(messages, temperature, response_schema)
+            client = self._get_sync_client()
             if self.provider == 'OpenAI':
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=self.api_config.get('MODEL_PARAMETERS', {}).get('max_tokens', 4096)
-                )
-                return response.choices[0].message.content
+                response = client.chat.completions.create(**request)
+            else:
+                response = client.messages.create(**request)
+            return self._parse_response(response)
             
-            elif self.provider == 'Anthropic':
-                # Convert OpenAI format to Anthropic format
-                system_msg = next((msg['content'] for msg in messages if msg['role'] == 'system'), '')
-                user_messages = [msg for msg in messages if msg['role'] != 'system']
-                
-                response = self.client.messages.create(
-                    model=self.model,
-                    system=system_msg,
-                    messages=user_messages,
-                    temperature=temperature,
-                    max_tokens=self.api_config.get('MODEL_PARAMETERS', {}).get('max_tokens', 4096)
-                )
-                return response.content[0].text
+        except Exception as e:
+            print(f"API call failed: {e}")
+            raise
+    
+    async def aget_chat_completion(self, client, messages: List[Dict[str, str]], temperature: float = 1.0,
+                                   response_schema: Dict[str, Any] = None) -> str:
+        """Async counterpart of get_chat_completion using an async client"""
+        try:
+            request = self._build_request(messages, temperature, response_schema)
+            if self.provider == 'OpenAI':
+                response = await client.chat.completions.create(**request)
+            else:
+                response = await client.messages.create(**request)
+            return self._parse_response(response)
             
         except Exception as e:
             print(f"API call failed: {e}")
             raise
     
+    def _response_cache_path(self, messages: List[Dict[str, str]], temperature: float,
+                             response_schema: Dict[str, Any] = None) -> Path:
+        """Location of the cached response for this request, or None when caching is off
+        
+        The key covers the full provider request (sampling, token cap, structured
+        output), so changing any of them never replays a stale response.
+        """
+        if self.cache_dir is None:
+            return None
+        request = self._build_request(messages, temperature, response_schema)
+        # Keyed with stdlib json so cache keys do not depend on orjson being installed
+        payload = json.dumps({"provider": self.provider, **request}, sort_keys=True)
+        key = hashlib.sha256(payload.encode()).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.json"
+    
+    def _load_cached_response(self, cache_path: Path) -> str:
+        """Return a cached response, or None on a miss"""
+        if cache_path is None or not cache_path.exists():
+            return None
+        try:
+            return _json_loads(cache_path.read_bytes())['response']
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def _store_cached_response(self, cache_path: Path, response: str):
+        """Write a response to the cache atomically"""
+        if cache_path is None:
+            return
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(_json_dumps({"response": response}))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"    Warning: could not write response cache {cache_path}: {e}")
+    
+    async def _agenerate_instruction(self, client, semaphore: asyncio.Semaphore, idx: int,
+                                     prompt: List[Dict[str, str]], dataset_stats: Dict[str, Any]) -> str:
+        """Generate one instruction with retries, bounded by the shared semaphore
+        
+        Rate limits, timeouts and server errors are retried with exponential backoff;
+        a response that is not the expected JSON is retried with a format reminder;
+        any other API error fails the record immediately. Only responses that parse
+        into an instruction are cached, so a malformed response is never replayed.
+        """
+        cache_path = self._response_cache_path(prompt, self.temperature, ISSUE_SCHEMA)
+        cached = self._load_cached_response(cache_path)
+        if cached is not None:
+            try:
+                return _json_loads(cached)['issue']
+            except (ValueError, KeyError):
+                pass
+        
+        error = None
+        async with semaphore:
+            for attempt in range(self.retry_attempts):
+                try:
+                    response = await self.aget_chat_completion(client, messages=prompt, temperature=self.temperature,
+                                                               response_schema=ISSUE_SCHEMA)
+                except self._retriable_errors as e:
+                    error = e
+                    print(f"    Generation attempt {attempt + 1} failed for record {idx}: {e}")
+                    if attempt + 1 < self.retry_attempts:
+                        await asyncio.sleep(min(30, self.retry_delay * 2 ** attempt) + random.random())
+                    continue
+                except self._api_errors as e:
+                    error = e
+                    print(f"    Generation failed for record {idx}: {e}")
+                    break
+                
+                try:
+                    instruction = _json_loads(response)['issue']
+                except (ValueError, KeyError, TypeError) as e:
+                    error = e
+                    print(f"    Generation attempt {attempt + 1} returned malformed JSON for record {idx}: {e}")
+                    prompt = self._add_json_reminder(prompt)
+                    continue
+                
+                self._store_cached_response(cache_path, response)
+                return instruction
+        
+        dataset_stats["generation_errors"].append(f"Record {idx}: {str(error)}")
+        return None
+    
+    def _add_json_reminder(self, prompt: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Return a copy of prompt whose user message ends with the JSON format reminder"""
+        reminded = []
+        for msg in prompt:
+            if msg['role'] == 'user' and not msg['content'].endswith(json_reminder):
+                msg = {**msg, 'content': msg['content'] + json_reminder}
+            reminded.append(msg)
+        return reminded
+    
+    async def _run_batch(self, jobs: List[Tuple], dataset_stats: Dict[str, Any],
+                         on_result=None) -> List[str]:
+        """Dispatch every prompt concurrently and return instructions in job order
+        
+        Each job is a tuple whose first two items are the record index and the prompt.
+        Jobs with byte-identical prompts share a single request. If given,
+        on_result(job, instruction) is called in job order as soon as each result
+        and all earlier ones are available.
+        """
+        client = self._init_async_client()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        # One request per distinct prompt, remembering which record issued it
+        unique: Dict[Tuple, Tuple[int, asyncio.Future]] = {}
+        tasks = []
+        for idx, prompt, *_ in jobs:
+            key = tuple((msg['role'], msg['content']) for msg in prompt)
+            if key not in unique:
+                unique[key] = (idx, asyncio.ensure_future(
+                    self._agenerate_instruction(client, semaphore, idx, prompt, dataset_stats)
+                ))
+            tasks.append(unique[key])
+        if len(unique) < len(jobs):
+            print(f"  Deduplicated {len(jobs) - len(unique)} identical prompts")
+        
+        try:
+            instructions = []
+            for job, (first_idx, task) in zip(jobs, tasks):
+                instruction = await task
+                if instruction is None and job[0] != first_idx:
+                    dataset_stats["generation_errors"].append(
+                        f"Record {job[0]}: generation failed for the identical prompt of record {first_idx}"
+                    )
+                if on_result is not None:
+                    on_result(job, instruction)
+                instructions.append(instruction)
+            return instructions
+        finally:
+            for _, task in unique.values():
+                task.cancel()
+            await client.close()
+    
+    def _load_instr_cache(self, cache_path: str):
+        """Load instruction templates persisted by a previous run"""
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    self._instr_cache = _json_loads(f.read())
+                print(f"Loaded {len(self._instr_cache)} cached instruction templates")
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: ignoring unreadable template cache {cache_path}: {e}")
+    
+    def _save_instr_cache(self, cache_path: str):
+        """Persist instruction templates for later runs"""
+        try:
+            with open(cache_path, 'wb') as f:
+                f.write(_json_dumps(self._instr_cache, indent=True))
+        except OSError as e:
+            print(f"Warning: could not write template cache {cache_path}: {e}")
+    
+    def _generate_from_templates(self, jobs: List[Tuple], dataset_stats: Dict[str, Any]) -> List[str]:
+        """Generate one instruction template per prompt structure and render it per record
+        
+        Records sharing a cache key only differ in the time range and failure count,
+        so the LLM is called once per key with slot markers and the result is filled
+        in locally for every other record.
+        """
+        missing = {}
+        for job in jobs:
+            cache_key = job[5]
+            if cache_key not in self._instr_cache and cache_key not in missing:
+                missing[cache_key] = job
+        
+        dataset_stats["template_cache_hits"] = len(jobs) - len(missing)
+        print(f"  Template cache: {dataset_stats['template_cache_hits']} hits, {len(missing)} misses")
+        
+        if missing:
+            templates = asyncio.run(self._run_batch(list(missing.values()), dataset_stats))
+            for (cache_key, job), template in zip(missing.items(), templates):
+                if not template:
+                    continue
+                # Multi-failure templates must also carry the failure count
+                required = [TIME_PERIOD_SLOT, NUM_SLOT] if cache_key.endswith("|multi") else [TIME_PERIOD_SLOT]
+                absent = [slot for slot in required if slot not in template]
+                if absent:
+                    dataset_stats["generation_errors"].append(
+                        f"Record {job[0]}: template for {cache_key} is missing {', '.join(absent)}"
+                    )
+                    continue
+                self._instr_cache[cache_key] = template
+        
+        instructions = []
+        for job in jobs:
+            template = self._instr_cache.get(job[5])
+            if template is None:
+                # The record that requested the template already has its own error entry
+                first_idx = missing[job[5]][0]
+                if job[0] != first_idx:
+                    dataset_stats["generation_errors"].append(
+                        f"Record {job[0]}: no instruction template for {job[5]} (requested by record {first_idx})"
+                    )
+                instructions.append(None)
+                continue
+            time_period, num = job[6], job[4]
+            instructions.append(template.replace(TIME_PERIOD_SLOT, time_period).replace(NUM_SLOT, str(num)))
+        return instructions
+    
     def timestamp2timeperiod(self, timestamp: int) -> str:
         """Convert timestamp to 30-minute time period"""
-        time = datetime.fromtimestamp(timestamp, self.timezone)
-        minute = time.minute
-        start_time = time.replace(minute=minute - (minute % 30), second=0, microsecond=0)
-        end_time = start_time + timedelta(minutes=30)
-        start_time_str = start_time.strftime('%Y-%m-%d %H:%M:%S')
-        end_time_str = end_time.strftime('%Y-%m-%d %H:%M:%S')
-        return f"{start_time_str} to {end_time_str}"
+        return _timestamp2timeperiod(timestamp, self.timezone)
     
     def timestamp2datetime(self, timestamp: int) -> str:
         """Convert timestamp to datetime string"""
-        time = datetime.fromtimestamp(timestamp, self.timezone)
-        return time.strftime('%Y-%m-%d %H:%M:%S')
+        return _timestamp2datetime(timestamp, self.timezone)
     
     def get_half_hour_conflict_failure_flag(self, meta_data: pd.DataFrame) -> Dict[int, bool]:
         """Identify failures that occur within the same 30-minute window"""
-        sorted_time = sorted(meta_data['timestamp'])
-        half_hour_conflict_failure_flag = {}
-        previous_failure_timestamp = 0
-        
-        for i in range(len(sorted_time)): 
-            timestamp = sorted_time[i]   
-            current_failure_timestamp_left = timestamp // 1800  # 30 minutes = 1800 seconds
-            
-            if current_failure_timestamp_left > previous_failure_timestamp:
-                previous_failure_timestamp = current_failure_timestamp_left
-                half_hour_conflict_failure_flag[timestamp] = False
-            else:
-                half_hour_conflict_failure_flag[timestamp] = True
-                half_hour_conflict_failure_flag[sorted_time[i - 1]] = True 
-                
-        return half_hour_conflict_failure_flag
+        timestamps = meta_data['timestamp'].to_numpy(np.int64)
+        buckets = timestamps // 1800  # 30 minutes = 1800 seconds
+        _, inverse, counts = np.unique(buckets, return_inverse=True, return_counts=True)
+        conflict_flags = counts[inverse] > 1
+        return dict(zip(timestamps.tolist(), conflict_flags.tolist()))
+    
+    def get_bucket_groups(self, meta_data: pd.DataFrame) -> Dict[int, Dict[str, List]]:
+        """Group failure records by 30-minute window in a single pass"""
+        bucket_col = meta_data['timestamp'] // 1800
+        return {
+            bucket: group[['timestamp', 'component', 'reason']].to_dict('list')
+            for bucket, group in meta_data.groupby(bucket_col)
+        }
     
-    def get_multi_response_dict(self, row: pd.Series, meta_data: pd.DataFrame) -> Tuple[int, Dict[str, List]]:
+    def get_multi_response_dict(self, timestamp: int, bucket_groups: Dict[int, Dict[str, List]]) -> Tuple[int, Dict[str, List]]:
         """Get multiple responses for failures in the same time window"""
-        num = 0
+        group = bucket_groups[timestamp // 1800]
         multi_dict = {
-            "datetime": [],
-            "component": [],
-            "reason": [],
+            "datetime": [self.timestamp2datetime(ts) for ts in group['timestamp']],
+            "component": group['component'],
+            "reason": group['reason'],
         }
         
-        cand_df = meta_data[meta_data['timestamp']//1800 == row['timestamp']//1800]
-        for idx, cand in cand_df.iterrows():
-            num += 1
-            multi_dict["datetime"].append(self.timestamp2datetime(cand['timestamp']))
-            multi_dict["component"].append(cand['component'])
-            multi_dict["reason"].append(cand['reason'])
-        
-        return num, multi_dict
+        return len(group['timestamp']), multi_dict
     
     def generate_queries_for_dataset(self, dataset_name: str, record_path: str, 
                                    output_path: str, extra_spec: str = None) -> Dict[str, Any]:
@@ -161,14 +562,19 @@ class QueryGenerator:
         print(f"Processing dataset: {dataset_name}")
         
         # Load ground truth data
-        meta_data = pd.read_csv(record_path)
+        # Only the columns used below are loaded
+        meta_data = pd.read_csv(
+            record_path,
+            usecols=['timestamp', 'component', 'reason'],
+            dtype={'timestamp': 'int64', 'component': 'string', 'reason': 'string'}
+        )
         
         # Identify multi-failure conflicts
         half_hour_conflict_failure_flag = self.get_half_hour_conflict_failure_flag(meta_data)
+        bucket_groups = self.get_bucket_groups(meta_data)
         
         # Initialize task tracking
         full_task_ID_list = list(self.task_templates.keys())
-        df = pd.DataFrame(columns=["task_index", "instruction", "scoring_points"])
         
         dataset_stats = {
             "dataset_name": dataset_name,
@@ -179,113 +585,84 @@ class QueryGenerator:
             "generation_errors": []
         }
         
-        for idx, row in meta_data.iterrows():
+        # Pass 1: build every prompt (no I/O)
+        task_indices = random.choices(full_task_ID_list, k=len(meta_data))
+        jobs = []
+        records = zip(
+            meta_data['timestamp'].to_numpy(),
+            meta_data['component'].to_numpy(),
+            meta_data['reason'].to_numpy()
+        )
+        for idx, (timestamp, component, reason) in enumerate(records):
             print(f"  Processing record {idx + 1}/{len(meta_data)}")
             
             try:
-                timestamp = row['timestamp']
-                reason = row['reason']
-                component = row['component']
                 datetime_str = self.timestamp2datetime(timestamp)
                 time_period = self.timestamp2timeperiod(timestamp)
-                task_index = random.choice(full_task_ID_list)
+                task_index = task_indices[idx]
+                renderer = self._renderers[task_index]
                 
                 # Track task distribution
                 dataset_stats["task_distribution"][task_index] += 1
                 
                 # Handle multi-failure scenarios
                 if half_hour_conflict_failure_flag[timestamp]:
-                    num, ans = self.get_multi_response_dict(row, meta_data)
+                    num, ans = self.get_multi_response_dict(timestamp, bucket_groups)
                     dataset_stats["multi_failure_queries"] += 1
                     
-                    scoring_points = ""
+                    scoring_parts = []
                     for i in range(num):
-                        scoring_points_template = self.task_templates[task_index]['scoring_points'].copy()
-                        
-                        scoring_points_filled = [points.format(
+                        scoring_parts.extend(render(
                             idx = f'{i+1}-th',
                             datetime = ans['datetime'][i],
                             reason = ans['reason'][i],
                             component = ans['component'][i],
-                        ) for points in scoring_points_template]
-                        scoring_points += "\\n".join(scoring_points_filled)
-                        scoring_points += "\\n"
+                        ) for render in renderer['scoring_points'])
+                    scoring_points = "\\n".join(scoring_parts) + "\\n"
                         
                     print(f"    Multi-response task with {num} root causes")
                     
                 else:
                     num = 1
-                    scoring_points = ""
-                    for point in self.task_templates[task_index]['scoring_points']:
-                        scoring_points += point.format(
-                            idx='only',
-                            time_period=time_period,
-                            datetime=datetime_str,
-                            component=component,
-                            reason=reason
-                        )
-                        scoring_points += "\\n"
+                    scoring_points = "\\n".join(render(
+                        idx='only',
+                        time_period=time_period,
+                        datetime=datetime_str,
+                        component=component,
+                        reason=reason
+                    ) for render in renderer['scoring_points']) + "\\n"
                 
-                # Build input specification
-                input_specification = "```known\\n"
-                for spec in self.task_templates[task_index]['input']:
-                    input_specification += f"- "
-                    input_specification += spec.format(
-                        num=num,
-                        time_period=time_period
-                    )
-                    input_specification += "\\n"
+                # Build input specification (with slot markers when templating)
+                if self.use_template_cache:
+                    cache_key = f"{task_index}|{extra_spec or ''}|{'multi' if num > 1 else 'single'}"
+                    spec_num, spec_time_period = NUM_SLOT, TIME_PERIOD_SLOT
+                else:
+                    cache_key = None
+                    spec_num, spec_time_period = num, time_period
                 
+                input_lines = [f"- {render(num=spec_num, time_period=spec_time_period)}"
+                               for render in renderer['input']]
                 if extra_spec:
-                    input_specification += f"- {extra_spec}\\n"
+                    input_lines.append(f"- {extra_spec}")
+                input_specification = "```known\\n" + "\\n".join(input_lines) + "\\n"
                 input_specification = input_specification.strip() + "\\n```"
                 
-                # Build output specification
-                output_specification = "```query\\n"
-                for spec in self.task_templates[task_index]['output']:
-                    output_specification += f"- "
-                    output_specification += spec.format(
-                        time_period="**UNKNOWN**",
-                        datetime="**UNKNOWN**",
-                        component="**UNKNOWN**",
-                        reason="**UNKNOWN**",
-                    )
-                    output_specification += "\\n"
-                output_specification = output_specification.strip() + "\\n```"
+                # Output specification is fixed per task
+                output_specification = renderer['output_specification']
                 
                 # Generate instruction using LLM
+                user_content = user.format(
+                    input_specification=input_specification, 
+                    output_specification=output_specification
+                )
+                if self.use_template_cache:
+                    user_content += template_note
                 prompt = [
                     {'role': 'system', 'content': system},
-                    {'role': 'user', 'content': user.format(
-                        input_specification=input_specification, 
-                        output_specification=output_specification
-                    )},
+                    {'role': 'user', 'content': user_content},
                 ]
                 
-                # Retry logic for instruction generation
-                instruction = None
-                for attempt in range(3):
-                    try:
-                        response = self.get_chat_completion(messages=prompt, temperature=1.0)
-                        instruction_data = json.loads(response)
-                        instruction = instruction_data['issue']
-                        break
-                    except Exception as e:
-                        print(f"    Generation attempt {attempt + 1} failed: {e}")
-                        if attempt == 2:
-                            dataset_stats["generation_errors"].append(f"Record {idx}: {str(e)}")
-                            continue
-                
-                if instruction:
-                    new_df = pd.DataFrame([{
-                        "task_index": task_index,
-                        "instruction": instruction,
-                        "scoring_points": scoring_points
-                    }])
-                    df = pd.concat([df, new_df], ignore_index=True)
-                    dataset_stats["queries_generated"] += 1
-                    
-                    print(f"    Generated: {task_index}")
+                jobs.append((idx, prompt, task_index, scoring_points, num, cache_key, time_period))
                 
             except Exception as e:
                 error_msg = f"Record {idx}: {str(e)}"
@@ -293,9 +670,36 @@ class QueryGenerator:
                 print(f"    Error: {error_msg}")
                 continue
         
-        # Save generated queries
-        df.to_csv(output_path, index=False)
-        print(f"  Saved {len(df)} queries to {output_path}")
+        # Pass 2: generate instructions with up to self.concurrency requests in flight,
+        # streaming each query to disk in record order as soon as it is available
+        print(f"  Generating {len(jobs)} instructions ({self.concurrency} concurrent requests)")
+        with open(output_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=QUERY_COLUMNS, lineterminator='\n')
+            writer.writeheader()
+            
+            def write_query(job: Tuple, instruction: str):
+                _, _, task_index, scoring_points, *_ = job
+                if not instruction:
+                    return
+                writer.writerow({
+                    "task_index": task_index,
+                    "instruction": instruction,
+                    "scoring_points": scoring_points
+                })
+                dataset_stats["queries_generated"] += 1
+                if dataset_stats["queries_generated"] % FSYNC_EVERY == 0:
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                print(f"    Generated: {task_index}")
+            
+            if self.use_template_cache:
+                for job, instruction in zip(jobs, self._generate_from_templates(jobs, dataset_stats)):
+                    write_query(job, instruction)
+            elif jobs:
+                asyncio.run(self._run_batch(jobs, dataset_stats, on_result=write_query))
+        
+        print(f"  Saved {dataset_stats['queries_generated']} queries to {output_path}")
         
         return dataset_stats
     
@@ -311,6 +715,11 @@ class QueryGenerator:
         os.makedirs(output_dir, exist_ok=True)
         all_stats = []
         
+        instr_cache_path = os.path.join(output_dir, "_instr_cache.json")
+        if self.use_template_cache:
+            self._load_instr_cache(instr_cache_path)
+        
+        dataset_jobs = []
         for dataset_name, record_path, extra_spec in dataset_configs:
             full_record_path = os.path.join(dataset_root, record_path)
             
@@ -321,12 +730,34 @@ class QueryGenerator:
             # Generate output path
             safe_name = dataset_name.replace("/", "_")
             output_path = os.path.join(output_dir, f"{safe_name}_query.csv")
+            dataset_jobs.append((dataset_name, full_record_path, output_path, extra_spec))
+        
+        # Datasets are independent, so each one is generated in its own process.
+        # The template cache is the exception: workers would each pay for the
+        # same structures, so those runs stay in this process and share one cache
+        results = []
+        if dataset_jobs and self.use_template_cache:
+            results = [_run_dataset(self, *job) for job in dataset_jobs]
+        elif dataset_jobs:
+            # Split the request budget so all workers together stay within
+            # RATE_LIMITS.concurrent_requests (each worker gets at least one slot)
+            max_workers = min(len(dataset_jobs), self.concurrency)
+            worker_concurrency = max(1, self.concurrency // max_workers)
             
-            # Generate queries for this dataset
-            dataset_stats = self.generate_queries_for_dataset(
-                dataset_name, full_record_path, output_path, extra_spec
-            )
-            
+            # Workers build their generator once from the parsed config instead of re-reading files
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_worker,
+                initargs=(self.api_config, self.task_templates, self.cache_dir, worker_concurrency)
+            ) as executor:
+                futures = [
+                    executor.submit(_generate_dataset_worker, *job)
+                    for job in dataset_jobs
+                ]
+                # Collect in submission order so the report lists datasets consistently
+                results = [future.result() for future in futures]
+        
+        for (dataset_name, *_), dataset_stats in zip(dataset_jobs, results):
             all_stats.append(dataset_stats)
             self.generation_stats["datasets_processed"].append(dataset_name)
             self.generation_stats["total_queries"] += dataset_stats["queries_generated"]
@@ -340,12 +771,62 @@ class QueryGenerator:
                     self.generation_stats["task_distribution"][task] = 0
                 self.generation_stats["task_distribution"][task] += count
         
+        if self.use_template_cache:
+            self._save_instr_cache(instr_cache_path)
+        
         return {
             "generation_summary": self.generation_stats,
             "dataset_details": all_stats
         }
 
 
+# QueryGenerator owned by the current worker process, set up by _init_worker
+_WORKER_GENERATOR: QueryGenerator = None
+
+
+def _init_worker(api_config: Dict[str, Any], task_templates: Dict[str, Any],
+                 cache_dir: Path, concurrency: int):
+    """Create the worker process's generator once
+    
+    concurrency is this worker's share of the configured request budget.
+    """
+    global _WORKER_GENERATOR
+    _WORKER_GENERATOR = QueryGenerator(
+        None, None, cache_dir=cache_dir,
+        api_config=api_config, task_templates=task_templates
+    )
+    _WORKER_GENERATOR.concurrency = concurrency
+
+
+def _run_dataset(generator: 'QueryGenerator', dataset_name: str, record_path: str,
+                 output_path: str, extra_spec: str = None) -> Dict[str, Any]:
+    """Generate queries for one dataset and return its statistics
+    
+    Seeds the RNG from the dataset name, so each dataset gets its own task
+    sequence that does not depend on the order or process it runs in.
+    """
+    random.seed(f"42:{dataset_name}")
+    try:
+        return generator.generate_queries_for_dataset(dataset_name, record_path, output_path, extra_spec)
+    except Exception as e:
+        # Keep one broken dataset from taking down the others and the report
+        print(f"Dataset {dataset_name} failed: {e}")
+        return {
+            "dataset_name": dataset_name,
+            "total_records": 0,
+            "queries_generated": 0,
+            "multi_failure_queries": 0,
+            "task_distribution": {},
+            "generation_errors": [f"Dataset {dataset_name}: {type(e).__name__}: {e}"]
+        }
+
+
+def _generate_dataset_worker(dataset_name: str, record_path: str, output_path: str,
+                             extra_spec: str = None) -> Dict[str, Any]:
+    """Generate queries for one dataset in a worker process"""
+    return _run_dataset(_WORKER_GENERATOR, dataset_name, record_path, output_path, extra_spec)
+
+
 def main():
     """Main function for query generation"""
     parser = argparse.ArgumentParser(description='Generate queries for OpenRCA datasets')
@@ -359,19 +840,24 @@ def main():
                        help='Output directory for generated queries')
     parser.add_argument('--report_file', type=str, required=True,
                        help='Path to save generation report')
+    parser.add_argument('--template_cache', action='store_true',
+                       help='Generate one instruction template per task structure and reuse it across records')
+    parser.add_argument('--cache_dir', type=str, default=None,
+                       help='Directory for cached LLM responses, reused on re-runs')
     
     args = parser.parse_args()
     
     try:
         # Initialize generator
-        generator = QueryGenerator(args.api_config, args.task_spec)
+        generator = QueryGenerator(args.api_config, args.task_spec, use_template_cache=args.template_cache,
+                                   cache_dir=args.cache_dir)
         
         # Generate queries for all datasets
         results = generator.generate_all_queries(args.dataset_root, args.output_dir)
         
         # Save generation report
-        with open(args.report_file, 'w') as f:
-            json.dump(results, f, indent=2)
+        with open(args.report_file, 'wb') as f:
+            f.write(_json_dumps(results, indent=True))
         
         print(f"\\nQuery generation completed!")
         print(f"Total queries generated: {results['generation_summary']['total_queries']}")
@@ -143,6 +143,7 @@ python query_generator.py \
     --task_spec "task_specification.json" \
     --output_dir "../outputs/queries" \
     --report_file "../outputs/generation_report.json" \
+    --cache_dir "../outputs/llm_cache" \
     2>&1 | tee ../outputs/logs/generation.log
 
 GENERATION_EXIT_CODE=${PIPESTATUS[0]}